@@ -1,26 +1,116 @@
 import numpy as np
 
+# rows per band in _step_kernel are chosen so one band is about this size
+TILE_BYTES = 1 << 18
+
+
+def _wrap_pad(grid, pad):
+    """Copy ``grid`` into the middle of ``pad`` with its borders wrapped around."""
+    # corners come along with the wrapped rows
+    pad[1:-1, 1:-1] = grid
+    pad[0, 1:-1] = grid[-1]
+    pad[-1, 1:-1] = grid[0]
+    pad[:, 0] = pad[:, -2]
+    pad[:, -1] = pad[:, 1]
+
+
+def _step_kernel(grid, out, pad, n, mask):
+    """Write the generation following ``grid`` into ``out``.
+
+    ``pad`` is an (h+2, w+2) uint8 scratch buffer, ``n`` an (h, w) uint8 and
+    ``mask`` an (h, w) bool scratch buffer; all three are overwritten.
+    """
+    h, w = grid.shape
+    _wrap_pad(grid, pad)
+    # work through bands of rows so the ten passes below hit cache-resident
+    # data instead of streaming the whole grid through memory each time
+    rows = max(1, TILE_BYTES // w)
+    for y0 in range(0, h, rows):
+        y1 = min(y0 + rows, h)
+        nb, mb, ob = n[y0:y1], mask[y0:y1], out[y0:y1]
+        # sum of the 3x3 block, centre included
+        np.copyto(nb, pad[y0:y1, :w])
+        for dy in range(3):
+            for dx in range(3):
+                if dy or dx:
+                    np.add(nb, pad[y0 + dy:y1 + dy, dx:dx + w], out=nb)
+        # n == 3: birth or survival with 2 neighbours, n == 4: survival with 3
+        np.equal(nb, 4, out=mb)
+        np.logical_and(mb, grid[y0:y1], out=mb)
+        np.equal(nb, 3, out=ob)
+        np.logical_or(ob, mb, out=ob)
+
+
+def neighbor_counts(grid, out=None, pad=None):
+    """Live neighbours of every cell of ``grid`` on the torus, as uint8.
+
+    ``out`` (h, w) and ``pad`` (h+2, w+2) are optional uint8 buffers to reuse.
+    """
+    h, w = grid.shape
+    if pad is None:
+        pad = np.empty((h + 2, w + 2), dtype=np.uint8)
+    _wrap_pad(grid, pad)
+    if out is None:
+        out = np.zeros((h, w), dtype=np.uint8)
+    else:
+        out[...] = 0
+    for dy in range(3):
+        for dx in range(3):
+            if (dy, dx) != (1, 1):
+                np.add(out, pad[dy:dy + h, dx:dx + w], out=out)
+    return out
+
+
+class NeighborCounter:
+    """neighbor_counts with scratch buffers kept between calls.
+
+    The returned array is reused by the next call; buffers are reallocated
+    only when the grid shape changes.
+    """
+
+    def __init__(self):
+        self._out = self._pad = None
+
+    def __call__(self, grid):
+        if self._out is None or self._out.shape != grid.shape:
+            h, w = grid.shape
+            self._out = np.empty((h, w), dtype=np.uint8)
+            self._pad = np.empty((h + 2, w + 2), dtype=np.uint8)
+        return neighbor_counts(grid, out=self._out, pad=self._pad)
+
+
 class GameOfLife:
     def __init__(self, width, height, randomize=True):
         self.width = width
         self.height = height
+        self._allocate((height, width))
         if randomize:
-            self.grid = np.random.choice([0, 1], size=(height, width))
-        else:
-            self.grid = np.zeros((height, width), dtype=int)
+            self._a[...] = np.random.choice([0, 1], size=(height, width))
+        self.grid = self._a
+
+    def _allocate(self, shape):
+        """(Re)create the double buffer and the step scratch space."""
+        h, w = shape
+        self._a = np.zeros((h, w), dtype=np.uint8)
+        self._b = np.empty((h, w), dtype=np.uint8)
+        self._n = np.empty((h, w), dtype=np.uint8)
+        self._mask = np.empty((h, w), dtype=bool)
+        self._pad = np.empty((h + 2, w + 2), dtype=np.uint8)
 
     def step(self):
-        """Advance the simulation by one generation."""
-        neighbors = sum(
-            np.roll(np.roll(self.grid, i, 0), j, 1)
-            for i in (-1, 0, 1)
-            for j in (-1, 0, 1)
-            if (i != 0 or j != 0)
-        )
-        birth = (neighbors == 3) & (self.grid == 0)
-        survive = ((neighbors == 2) | (neighbors == 3)) & (self.grid == 1)
-        self.grid[:] = 0
-        self.grid[birth | survive] = 1
+        """Advance the simulation by one generation.
+
+        ``grid`` is replaced by the other of two buffers that take turns, so an
+        array read from ``grid`` is overwritten two steps later; copy it to
+        keep it.
+        """
+        # callers may assign a grid of another shape; such grids are only
+        # read, the result always lands in one of our own buffers
+        if self._a.shape != self.grid.shape:
+            self._allocate(self.grid.shape)
+        _step_kernel(self.grid, self._b, self._pad, self._n, self._mask)
+        self._a, self._b = self._b, self._a
+        self.grid = self._a
 
     def set_pattern(self, pattern, x, y):
         """Place a smaller array pattern at position (x, y)."""
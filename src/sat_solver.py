@@ -1,64 +1,165 @@
 import numpy as np
 import random
+from functools import lru_cache
 from z3 import Solver, Bool, Sum, If, And, Or, Not, is_true, sat
 from termcolor import colored
 
+# flat tuple of cell variables, cell (y, x) lives at index y * w + x
 def make_bool_grid(prefix, h, w):
-    return [[Bool(f"{prefix}_{y}_{x}") for x in range(w)] for y in range(h)]
+    return tuple(Bool(f"{prefix}_{y}_{x}") for y in range(h) for x in range(w))
 
+NEIGHBOR_OFFSETS = np.array(
+    [(dy, dx) for dy in (-1, 0, 1) for dx in (-1, 0, 1) if (dy, dx) != (0, 0)]
+)
 
-def neighbors(grid, x, y, h, w):
-    ns = []
-    for dy in (-1, 0, 1):
-        for dx in (-1, 0, 1):
-            if dx == 0 and dy == 0:
-                continue
-            ny, nx = y + dy, x + dx
-            if 0 <= ny < h and 0 <= nx < w:
-                ns.append(grid[ny][nx])
-    return ns
 
+# (h * w, 8) table of flat neighbour indices, -1 where the neighbour is off-grid
 def precompute_neighbors(h, w):
-    neigh = {}
-    for y in range(h):
-        for x in range(w):
-            ns = []
-            for dy in (-1, 0, 1):
-                for dx in (-1, 0, 1):
-                    if dx == 0 and dy == 0:
-                        continue
-                    ny, nx = y + dy, x + dx
-                    if 0 <= ny < h and 0 <= nx < w:
-                        ns.append((ny, nx))
-            neigh[(y, x)] = ns
-    return neigh
-
-def life_transition(s, curr, nxt, neigh):
-    for (y, x), ns in neigh.items():
-        live = Sum([If(curr[ny][nx], 1, 0) for ny, nx in ns])
-        s.add(
-            nxt[y][x]
-            == Or(
-                And(curr[y][x], Or(live == 2, live == 3)),
-                And(Not(curr[y][x]), live == 3),
-            )
-        )
-
-def allowed_cells_from_target(target, steps, h, w):
-    ys, xs = np.where(target == 1)
-    allowed = set()
-
-    for ty, tx in zip(ys, xs):
-        for dy in range(-steps, steps + 1):
-            for dx in range(-steps, steps + 1):
-                y = ty + dy
-                x = tx + dx
-                if 0 <= y < h and 0 <= x < w:
-                    allowed.add((y, x))
-
+    ys, xs = np.mgrid[0:h, 0:w]
+    ny = ys[..., None] + NEIGHBOR_OFFSETS[:, 0]
+    nx = xs[..., None] + NEIGHBOR_OFFSETS[:, 1]
+    valid = (ny >= 0) & (ny < h) & (nx >= 0) & (nx < w)
+    neigh = np.where(valid, ny * w + nx, -1)
+    return neigh.reshape(h * w, 8)
+
+def life_transition(constraints, curr, nxt, neigh):
+    table = neigh.tolist()  # plain ints are much cheaper to index with
+    for i, ns in enumerate(table):
+        live = Sum([If(curr[j], 1, 0) for j in ns if j >= 0])
+        # alive next iff 3 neighbours, or alive now with 2
+        constraints.append(nxt[i] == Or(live == 3, And(curr[i], live == 2)))
+
+def box_count(mask):
+    # number of set cells in each cell's 3x3 block, off-grid counts as empty
+    h, w = mask.shape
+    padded = np.pad(mask.astype(np.uint8), 1)
+    count = np.zeros((h, w), dtype=np.uint8)
+    for dy in range(3):
+        for dx in range(3):
+            count += padded[dy:dy + h, dx:dx + w]
+    return count
+
+def allowed_mask_from_target(target, steps):
+    # cells within `steps` (Chebyshev distance) of a live target cell,
+    # i.e. the live cells dilated `steps` times with a 3x3 block
+    allowed = target != 0
+    for _ in range(steps):
+        allowed = box_count(allowed) > 0
     return allowed
+
+def reachable_masks(first, steps):
+    # Conservative over-approximation of the cells that can be alive at each
+    # step, starting from the mask of cells that may be alive at t=0. Birth
+    # needs 3 live neighbours and survival the cell plus 2, so a cell can
+    # only be alive at t+1 if its 3x3 block holds at least 3 candidates at t.
+    masks = [first]
+    for _ in range(steps):
+        masks.append(box_count(masks[-1]) >= 3)
+    return masks
 # ---------- Backward SAT solver ----------
 
+@lru_cache(maxsize=8)
+def transition_constraints(h, w, steps):
+    # The cell layers and the transitions between them depend only on the
+    # grid shape, so they are built once and shared by every session of
+    # that shape (the tree search solves many targets of the same size).
+    layers = tuple(make_bool_grid(f"t{t}", h, w) for t in range(steps + 1))
+    neigh = precompute_neighbors(h, w)
+    constraints = []
+    for t in range(steps):
+        life_transition(constraints, layers[t], layers[t + 1], neigh)
+    return layers, tuple(constraints)
+
+def exclusion_constraints(first, exclude_grids):
+    constraints = []
+    for ex_grid in exclude_grids:
+        max_true = int(ex_grid.sum())
+        if max_true == 0:
+            continue  # Skip empty grids
+
+        # literal that is true where the new grid differs from ex_grid
+        mismatches = [
+            Not(v) if ex_cell else v for v, ex_cell in zip(first, ex_grid.ravel().tolist())
+        ]
+
+        # Ensure less than 90% match of true values
+        min_mismatches = int(max_true * 0.1) + 1
+        if min_mismatches == 1:
+            constraints.append(Or(mismatches))
+        else:
+            constraints.append(Sum([If(m, 1, 0) for m in mismatches]) >= min_mismatches)
+    return constraints
+
+
+class SolveSession:
+    """Backward instance for one target, built once and queried per bound."""
+
+    def __init__(self, target, steps=1, timeout_ms=10000, restrict=True):
+        self.target = np.array(target, dtype=np.uint8)
+        self.steps = steps
+        self.timeout_ms = timeout_ms
+        self.h, self.w = h, w = self.target.shape
+
+        self.layers, transitions = transition_constraints(h, w, steps)
+        c = self.constraints = list(transitions)
+
+        # fix final state, one conjunction for the live and one for the dead cells
+        last = self.layers[steps]
+        flat_target = self.target.ravel()
+        c.append(And([last[i] for i in np.flatnonzero(flat_target != 0).tolist()]))
+        c.append(And([Not(last[i]) for i in np.flatnonzero(flat_target == 0).tolist()]))
+
+        if restrict:
+            allowed = allowed_mask_from_target(self.target, steps)
+            flat_allowed = allowed.ravel()
+            c.append(And([Not(self.layers[0][i]) for i in np.flatnonzero(~flat_allowed).tolist()]))
+
+            # cells that cannot be alive at an intermediate step become unit
+            # clauses, so propagation prunes them before any decision
+            masks = reachable_masks(allowed, steps)
+            for t in range(1, steps):
+                layer = self.layers[t]
+                c.append(And([Not(layer[i]) for i in np.flatnonzero(~masks[t]).tolist()]))
+
+            c.append(Or([self.layers[0][i] for i in np.flatnonzero(flat_allowed).tolist()]))
+
+        self.population = Sum(self.layers[0])
+
+    def try_bound(self, max_ones, exclude_grids=None):
+        """Return an initial grid with at most ``max_ones`` live cells, or None."""
+        # A fresh solver per query on purpose: after push() or check() with
+        # assumptions Z3 switches to its incremental core, which is several
+        # times slower on these instances than solving from scratch.
+        s = Solver()
+        if self.timeout_ms:
+            s.set("timeout", self.timeout_ms)
+        s.set("random_seed", random.randint(0, 10000)) # for new boards
+
+        s.add(self.constraints)
+        # limit initial population
+        s.add(self.population <= max_ones)
+        if exclude_grids:
+            s.add(exclusion_constraints(self.layers[0], exclude_grids))
+
+        print("  " + colored("Solving", "blue") + "...")
+
+        if s.check() != sat:
+            print("    " + colored("UNSAT", "red", attrs=["bold"]))
+            return None
+
+        print("    " + colored("SAT", "green") + " - extracting model")
+
+        # direct lookups; a cell the model leaves unassigned (None) is dead
+        m = s.model()
+        init = np.fromiter(
+            (1 if is_true(m[var]) else 0 for var in self.layers[0]),
+            dtype=np.uint8,
+            count=self.h * self.w,
+        ).reshape(self.h, self.w)
+
+        return init
+
+
 def solve_initial_for_target(
     target,
     steps=1,
@@ -67,76 +168,8 @@ def solve_initial_for_target(
     max_ones=500,
     exclude_grids=None
 ):
-    margin = steps
-    target = np.array(target, dtype=int)
-    h, w = target.shape
-
-    layers = [make_bool_grid(f"t{t}", h, w) for t in range(steps + 1)]
-
-    s = Solver()
-    if timeout_ms:
-        s.set("timeout", timeout_ms)
-    s.set("random_seed", random.randint(0, 10000)) # for new boards
-
-    neigh = precompute_neighbors(h, w)
-    
-    for t in range(steps):
-        life_transition(s, layers[t], layers[t + 1], neigh)
-
-    # fix final state
-    for y in range(h):
-        for x in range(w):
-            s.add(layers[steps][y][x] == bool(target[y, x]))
-
-    # limit initial population
-    s.add(
-        Sum([layers[0][y][x] for y in range(h) for x in range(w)]) <= max_ones
-    )
-
-    if restrict:
-        allowed = allowed_cells_from_target(target, steps, h, w)
-
-        for y in range(h):
-            for x in range(w):
-                if (y, x) not in allowed:
-                    s.add(layers[0][y][x] == False)
-
-        s.add(Or([layers[0][y][x] for (y, x) in allowed]))
-
-    if exclude_grids:
-        for ex_grid in exclude_grids:
-            max_true = int(ex_grid.sum())
-            if max_true == 0:
-                continue  # Skip empty grids
-
-            # Create a list of conditions for each cell
-            mismatch_conditions = []
-            for y in range(h):
-                for x in range(w):
-                    ex_cell = bool(ex_grid[y, x])
-                    mismatch_conditions.append(layers[0][y][x] != ex_cell)
-
-            # Ensure less than 90% match of true values
-            min_mismatches = int(max_true * 0.1) + 1
-            s.add(Sum([If(cond, 1, 0) for cond in mismatch_conditions]) >= min_mismatches)
-    
-    print("  " + colored("Solving", "blue") + "...")
-
-    if s.check() != sat:
-        print("    " + colored("UNSAT", "red", attrs=["bold"]))
-        return None
-
-    print("    " + colored("SAT", "green") + " - extracting model")
-
-    m = s.model()
-    init = np.zeros((h, w), dtype=int)
-
-    for y in range(h):
-        for x in range(w):
-            v = m.evaluate(layers[0][y][x], model_completion=True)
-            init[y, x] = 1 if is_true(v) else 0
-
-    return init
+    session = SolveSession(target, steps=steps, timeout_ms=timeout_ms, restrict=restrict)
+    return session.try_bound(max_ones, exclude_grids)
 
 
 
@@ -145,34 +178,42 @@ def solve_initial_minimal_iterative(
     steps=1,
     start_bound=2500,
     timeout_ms=5000,
-    exclude_grids=None
+    exclude_grids=None,
+    stop=None
 ):
-    target = np.array(target, dtype=int)
+    # ``stop`` is an optional threading.Event; once it is set the search ends
+    # after the current bound and returns the best solution found so far
+    session = SolveSession(target, steps=steps, timeout_ms=timeout_ms, restrict=True)
     best = None
-    bound = start_bound
+    # lo: largest bound without a solution
+    lo, bound = -1, start_bound
 
     print(colored("Starting", "blue") + " iterative minimization")
 
-    while bound >= 0:
+    # the first model is usually close to the optimum, so stepping down
+    # from it needs only a few cheap SAT calls and one UNSAT proof
+    while bound > lo:
+        if stop is not None and stop.is_set():
+            print("  " + colored("Stopped", "yellow") + " before the search finished")
+            return best
+
         print("  " + colored("trying", "blue") + f" max_ones <= {bound}")
 
-        sol = solve_initial_for_target(
-            target,
-            steps=steps,
-            max_ones=bound,
-            timeout_ms=timeout_ms,
-            restrict=True,
-            exclude_grids=exclude_grids
-        )
+        sol = session.try_bound(bound, exclude_grids)
 
         if sol is None:
             print("    " + colored("UNSAT", "red") + " at this bound")
-            break
-            
+            if best is None:
+                break
+            # the random step may have skipped counts between the failed
+            # bound and the best solution; the last probe is one below it
+            lo, bound = bound, ones - 1
+            continue
+
         best = sol
         ones = int(sol.sum())
-        # THIS IS WACKY
-        bound = ones - random.randint(1, 3)
+        # never probe a failed bound or the count just found again
+        bound = min(max(ones - random.randint(1, 3), lo + 1), ones - 1)
         print("    " + colored("found", "green") + f" solution with {ones} live cells")
 
     if best is not None:
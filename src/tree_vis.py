@@ -4,11 +4,13 @@ import os
 import datetime
 import threading
 import time
-from game_of_life import GameOfLife
+from game_of_life import GameOfLife, NeighborCounter
 import random
 from sat_solver import solve_initial_for_target, solve_initial_minimal_iterative
 from termcolor import colored
 import pickle
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 
 CELL = 10
 FPS = 30
@@ -18,43 +20,172 @@ GRID_COLOR = (200, 200, 200)
 DEAD = (255, 255, 255)
 ALIVE_COLOR = (40, 40, 40)
 HIGHLIGHT_COLOR = (255, 100, 100)
+# room kept for the "d:<depth>" label right of a node when culling
+DEPTH_LABEL_MARGIN = 60
+# rendered label surfaces kept around between frames
+TEXT_CACHE_SIZE = 4096
+# below this zoom nodes are plain boxes written straight into the pixels
+LOD_ZOOM = 0.3
 
 VIRIDIS_COLORS = [
     (68, 1, 84), (71, 44, 122), (59, 81, 139), (44, 113, 142),
     (33, 144, 141), (39, 173, 129), (92, 200, 99), (170, 220, 50), (253, 231, 37)
 ]
 
-def get_viridis_color(n_idx):
-    # n_idx is number of neighbors (0-8)
-    return VIRIDIS_COLORS[int(n_idx)]
+# board palette: live cells by neighbour count, then dead cells and grid lines
+BOARD_COLORS = VIRIDIS_COLORS + [DEAD, GRID_COLOR]
+BOARD_DEAD = len(VIRIDIS_COLORS)
+BOARD_LINE = BOARD_DEAD + 1
 
 class Node:
     def __init__(self, grid, parent=None):
-        self.grid = grid.copy()
+        self.grid = grid
         self.parent = parent
+        self.depth = 0 if parent is None else parent.depth + 1
         self.children = []
-        self.excluded_from_sat = [] # List of grids already tried as ancestors
+        self.excluded_from_sat = [] # List of grids already tried as ancestors (read-only, never edited once stored)
         self.x = 0
         self.y = 0
         self.rect = pygame.Rect(0, 0, 40, 30)
+        self._vwidth = None
+
+    def __setstate__(self, state):
+        # trees pickled before grids were packed carry a plain "grid" array
+        grid = state.pop("grid", None)
+        self._vwidth = None
+        self.__dict__.update(state)
+        if grid is not None:
+            self.grid = grid
 
     @property
-    def depth(self):
-        d = 0
-        curr = self
-        while curr.parent:
-            d += 1
-            curr = curr.parent
-        return d
+    def grid(self):
+        """The cells as a fresh uint8 array, unpacked from ``packed_grid``."""
+        return np.unpackbits(self.packed_grid, axis=1, count=self.width)
+
+    @grid.setter
+    def grid(self, grid):
+        # eight cells per byte: a search keeps hundreds of these around
+        self.packed_grid = np.packbits(np.asarray(grid) != 0, axis=1)
+        self.width = grid.shape[1]
+        self.cell_count = int(np.bitwise_count(self.packed_grid).sum())
+
+    def set_depth(self, depth):
+        """Set the depth of this node and renumber its whole subtree."""
+        stack = [(self, depth)]
+        while stack:
+            node, d = stack.pop()
+            node.depth = d
+            stack.extend((c, d + 1) for c in node.children)
+
+    def vwidth(self):
+        """Width of the subtree in layout units (60 per leaf), cached."""
+        if self._vwidth is None:
+            # children before parents over the part that is not cached yet
+            stack, order = [self], []
+            while stack:
+                node = stack.pop()
+                order.append(node)
+                stack.extend(c for c in node.children if c._vwidth is None)
+            for node in reversed(order):
+                node._vwidth = sum(c._vwidth for c in node.children) if node.children else 60
+        return self._vwidth
+
+    def _invalidate_width(self):
+        # a cached node implies cached descendants, so stop at the first gap
+        node = self
+        while node is not None and node._vwidth is not None:
+            node._vwidth = None
+            node = node.parent
 
     def add_child(self, grid):
         child = Node(grid, parent=self)
         self.children.append(child)
+        self._invalidate_width()
         return child
 
     def add_child_node(self, child_node):
         self.children.append(child_node)
+        self._invalidate_width()
         child_node.parent = self
+        child_node.set_depth(self.depth + 1)
+
+def level_order(roots):
+    """Yield every node under ``roots`` breadth-first, one level at a time."""
+    queue = deque(roots)
+    while queue:
+        node = queue.popleft()
+        yield node
+        queue.extend(node.children)
+
+def _unpack_grids(bits, shapes):
+    """Split concatenated row-packed bits back into (h, w) uint8 grids."""
+    grids, pos = [], 0
+    for h, w in shapes.tolist():
+        size = h * ((w + 7) // 8)
+        grids.append(np.unpackbits(bits[pos:pos + size].reshape(h, -1), axis=1, count=w))
+        pos += size
+    return grids
+
+def tree_to_arrays(roots, current):
+    """Flatten a forest into the arrays stored in .tree.npz files.
+
+    Every distinct grid is stored once: its packed rows go into one flat
+    ``bits`` array with its (h, w) in ``shapes``. Nodes are numbered in level
+    order; ``grid_ids`` gives each node's grid and ``parents`` its parent's
+    number (-1 for roots). Excluded grids, mostly the grids of children,
+    point into the same pool through ``ex_ids`` and are tagged with the
+    number of the node that excluded them in ``ex_owner``.
+    """
+    nodes = list(level_order(roots))
+    index = {id(n): i for i, n in enumerate(nodes)}
+    parents = [-1 if n.parent is None else index[id(n.parent)] for n in nodes]
+
+    pool, packed, shapes = {}, [], []
+    def grid_id(bits, width):
+        key = (bits.shape, width, bits.tobytes())
+        if key not in pool:
+            pool[key] = len(packed)
+            packed.append(bits.ravel())
+            shapes.append((bits.shape[0], width))
+        return pool[key]
+
+    grid_ids = [grid_id(n.packed_grid, n.width) for n in nodes]
+    ex_ids, ex_owner = [], []
+    for i, n in enumerate(nodes):
+        for g in n.excluded_from_sat:
+            ex_ids.append(grid_id(np.packbits(np.asarray(g) != 0, axis=1), g.shape[1]))
+            ex_owner.append(i)
+    return {
+        "bits": np.concatenate(packed),
+        "shapes": np.array(shapes, dtype=np.int32),
+        "grid_ids": np.array(grid_ids, dtype=np.int32),
+        "parents": np.array(parents, dtype=np.int32),
+        "current": index[id(current)],
+        "ex_ids": np.array(ex_ids, dtype=np.int32),
+        "ex_owner": np.array(ex_owner, dtype=np.int32),
+    }
+
+def tree_from_arrays(data):
+    """Rebuild ``(roots, current_node)`` from the arrays of tree_to_arrays."""
+    grids = _unpack_grids(data["bits"], data["shapes"])
+    grid_ids = data["grid_ids"].tolist()
+    excluded = [grids[i] for i in data["ex_ids"].tolist()]
+
+    nodes, roots = [], []
+    # level order puts every parent before its children
+    for gid, parent in zip(grid_ids, data["parents"].tolist()):
+        if parent < 0:
+            node = Node(grids[gid])
+            roots.append(node)
+        else:
+            node = nodes[parent].add_child(grids[gid])
+        nodes.append(node)
+    # nodes keep packed copies, so the unpacked grids can be shared read-only
+    for grid in excluded:
+        grid.flags.writeable = False
+    for owner, grid in zip(data["ex_owner"].tolist(), excluded):
+        nodes[owner].excluded_from_sat.append(grid)
+    return roots, nodes[int(data["current"])]
 
 class TreeVisualizer:
     def __init__(self, w=30, h=30):
@@ -69,6 +200,10 @@ class TreeVisualizer:
         self.screen_w = self.grid_width + SIDEBAR_WIDTH
         
         self.screen = pygame.display.set_mode((self.screen_w, self.screen_h))
+        # the three regions drawn by draw_grid, draw_tree and draw_ui
+        self._board_rect = pygame.Rect(0, TOP, self.grid_width, self.grid_height)
+        self._sidebar_rect = pygame.Rect(self.grid_width, 0, SIDEBAR_WIDTH, self.screen_h)
+        self._header_rect = pygame.Rect(0, 0, self.screen_w, TOP)
         pygame.display.set_caption("Tree Visualization - Game of Life")
         self.clock = pygame.time.Clock()
         self.paused = True
@@ -77,12 +212,17 @@ class TreeVisualizer:
         self.searching = False
         self.lock = threading.Lock()
         self.search_thread = None
+        # set when the search is stopped so the worker's pause ends at once
+        self._search_wakeup = threading.Event()
+        self._solve_time = 0.0
         
         self.loading = False
 
         self.font = pygame.font.SysFont("Arial", 12)
         self.depth_font = pygame.font.SysFont("Arial", 10, italic=True)
         self.btn_font = pygame.font.SysFont("Arial", 15, bold=True)
+        self._text_cache = {}
+        self._menu_overlay = None
         
         # Scrolling & Zoom
         self.tree_offset_x = 0
@@ -98,41 +238,145 @@ class TreeVisualizer:
         self.step_btn = pygame.Rect(360, 15, 60, 30)
         self.go_deeper_btn = pygame.Rect(430, 15, 100, 30)
         self.rerender_btn = pygame.Rect(540, 15, 100, 30)
-
-        self.roots = [Node(self.game.grid)]
+        # the labels never change, so both states of the bar are drawn once
+        self._headers = {False: self._render_header(False), True: self._render_header(True)}
+
+        # uint8 counts, usable as indices into the board palette
+        self._count_neighbors = NeighborCounter()
+        # the board is only re-rendered after something marks it dirty
+        self._grid_surf = pygame.Surface((self.grid_width, self.grid_height))
+        self._grid_dirty = True
+        # sidebar and button bar need repainting; run() only repaints the
+        # regions that changed
+        self._tree_dirty = True
+        self._ui_dirty = True
+        # palette mapped to the surface's pixel format
+        self._board_lut = np.array([self._grid_surf.map_rgb(c) for c in BOARD_COLORS], dtype=np.uint32)
+
+        self._set_roots([Node(self.game.grid)])
         self.current_node = self.roots[0]
         self.config_files = []
+        self._configs_cache = {}
+        # compression and file writes run here, off the UI thread
+        self._io_pool = ThreadPoolExecutor(max_workers=1)
+        # tree layout cache and the nodes drawn in the last frame
+        self._layout = None
+        self._visible_nodes = []
+        self._visible_boxes = np.empty((0, 4), dtype=np.int32)
 
     def neighbors(self, grid):
-        return sum(
-            np.roll(np.roll(grid, i, 0), j, 1)
-            for i in (-1, 0, 1)
-            for j in (-1, 0, 1)
-            if (i, j) != (0, 0)
-        )
+        return self._count_neighbors(grid)
+
+    def _set_roots(self, roots):
+        """Replace the root list; callers hold the lock."""
+        self.roots = roots
+        # position of each root by id(), so reparenting avoids list scans
+        self._root_index = {id(n): i for i, n in enumerate(roots)}
+
+    def _add_root(self, node):
+        self._root_index[id(node)] = len(self.roots)
+        self.roots.append(node)
+
+    def _invalidate(self):
+        """Repaint the whole window on the next frame."""
+        self._grid_dirty = self._tree_dirty = self._ui_dirty = True
+
+    def _set_grid(self, grid):
+        """Show ``grid`` on the board; callers hold the lock.
+
+        The board takes ownership of ``grid`` and may edit it in place. Node
+        grids unpack to a fresh array on every access, so they need no copy.
+        """
+        self.game.grid = grid
+        self._grid_dirty = True
+        self._tree_dirty = True
 
     def draw_grid(self):
         with self.lock:
-            grid_to_draw = self.game.grid.copy()
-        
-        screen_grid_rect = pygame.Rect(0, TOP, self.grid_width, self.grid_height)
-        pygame.draw.rect(self.screen, DEAD, screen_grid_rect)
-        
-        neigh = self.neighbors(grid_to_draw)
-        for y in range(self.h):
-            for x in range(self.w):
-                if grid_to_draw[y, x]:
-                    color = get_viridis_color(neigh[y, x])
-                    pygame.draw.rect(
-                        self.screen,
-                        color,
-                        (x * CELL, y * CELL + TOP, CELL, CELL),
-                    )
-
-        for x in range(self.w + 1):
-            pygame.draw.line(self.screen, GRID_COLOR, (x * CELL, TOP), (x * CELL, TOP + self.grid_height))
-        for y in range(self.h + 1):
-            pygame.draw.line(self.screen, GRID_COLOR, (0, y * CELL + TOP), (self.grid_width, y * CELL + TOP))
+            dirty = self._grid_dirty
+            if dirty:
+                # only this (main) thread edits the board in place; the
+                # worker swaps in whole new arrays, so no copy is needed
+                grid_to_draw = self.game.grid
+                self._grid_dirty = False
+
+        if dirty:
+            # one palette lookup per cell, broadcast straight into CELL x CELL
+            # blocks of the surface's (x, y) pixels, grid lines on top
+            neigh = self.neighbors(grid_to_draw)
+            # a loaded tree may hold larger grids than the board shows
+            live = grid_to_draw[:self.h, :self.w] != 0
+            colors = self._board_lut[np.where(live, neigh[:self.h, :self.w], BOARD_DEAD)]
+            pix = pygame.surfarray.pixels2d(self._grid_surf)
+            pix.reshape(self.w, CELL, self.h, CELL)[...] = colors.T[:, None, :, None]
+            pix[::CELL, :] = self._board_lut[BOARD_LINE]
+            pix[:, ::CELL] = self._board_lut[BOARD_LINE]
+            # the surface stays locked while the view is alive
+            del pix
+
+        self.screen.blit(self._grid_surf, (0, TOP))
+
+    def _render(self, font, text, color):
+        """font.render with the surfaces of recent labels kept for reuse."""
+        key = (id(font), text, color)
+        surf = self._text_cache.get(key)
+        if surf is None:
+            if len(self._text_cache) >= TEXT_CACHE_SIZE:
+                # dicts keep insertion order: drop the oldest entry
+                del self._text_cache[next(iter(self._text_cache))]
+            surf = self._text_cache[key] = font.render(text, True, color)
+        return surf
+
+    def _tree_layout(self, zoom):
+        """Layout of every root, rebuilt when the tree or the zoom changes.
+
+        Returns ``(key, nodes, parents, lx, ly, starts)``: nodes in per-root
+        visit order, the index of each node's parent (-1 for roots), node
+        positions in layout units before pan and zoom, and where each root's
+        nodes start. Callers hold the lock.
+        """
+        key = (tuple(map(id, self.roots)), zoom)
+        layout = self._layout
+        # adding a child clears the cached widths up to the root, so cached
+        # root widths mean the shape below them is unchanged
+        if (layout is not None and layout[0] == key
+                and all(r._vwidth is not None for r in self.roots)):
+            return layout
+
+        nodes, parents, lx, ly, starts = [], [], [], [], []
+        # the root anchor depends on the zoom; it is summed in parent by
+        # parent rather than added at draw time, and the float rounding of
+        # that sum decides which pixel an edge ends on
+        vx_base = SIDEBAR_WIDTH // 2 / zoom
+        for i, root in enumerate(self.roots):
+            starts.append(len(nodes))
+            # children are pushed in order, so each root's visit order
+            # reversed is a post-order
+            stack = [(root, -1, vx_base, 80 / zoom + i * 200)]
+            while stack:
+                node, parent, x, y = stack.pop()
+                idx = len(nodes)
+                nodes.append(node)
+                parents.append(parent)
+                lx.append(x)
+                ly.append(y)
+
+                curr_vx = x - node.vwidth() // 2
+                for child in node.children:
+                    cvw = child.vwidth()
+                    stack.append((child, idx, curr_vx + cvw // 2, y + 60))
+                    curr_vx += cvw
+        starts.append(len(nodes))
+
+        self._layout = (key, nodes, np.array(parents, dtype=np.intp),
+                        np.array(lx, dtype=np.float64), np.array(ly, dtype=np.float64), starts)
+        return self._layout
+
+    def _node_at(self, mx, my):
+        """The first node drawn in the last frame whose rect holds (mx, my)."""
+        b = self._visible_boxes
+        hit = np.flatnonzero((b[:, 0] <= mx) & (mx < b[:, 2]) & (b[:, 1] <= my) & (my < b[:, 3]))
+        return self._visible_nodes[hit[0]] if len(hit) else None
 
     def draw_tree(self):
         tree_rect = pygame.Rect(self.grid_width, 0, SIDEBAR_WIDTH, self.screen_h)
@@ -144,78 +388,121 @@ class TreeVisualizer:
         # Scaled dimensions
         node_w = int(40 * self.zoom_level)
         node_h = int(30 * self.zoom_level)
-        depth_spacing = int(60 * self.zoom_level)
-        width_spacing = int(60 * self.zoom_level)
 
+        # the layout arrays are rebuilt, never edited, when the tree changes,
+        # so a snapshot taken under the lock can be drawn without it
         with self.lock:
-            def get_width(node):
-                if not node.children:
-                    return width_spacing
-                return sum(get_width(c) for c in node.children)
-
-            def layout(node, x, y):
-                node.x = self.grid_width + (x + self.tree_offset_x) * self.zoom_level
-                node.y = (y + self.tree_offset_y) * self.zoom_level
-                
-
-                node.rect.w = node_w
-                node.rect.h = node_h
-                node.rect.center = (node.x, node.y)
-                
-                if not node.children:
-                    return
-                
-                total_w = get_width(node)
-                curr_x = x - total_w // 2 / self.zoom_level
-                
-                def get_vwidth(node):
-                    if not node.children: return 60
-                    return sum(get_vwidth(c) for c in node.children)
-                
-                vw = get_vwidth(node)
-                curr_vx = x - vw // 2
-                for child in node.children:
-                    cvw = get_vwidth(child)
-                    layout(child, curr_vx + cvw // 2, y + 60)
-                    curr_vx += cvw
-
-            vx_base = SIDEBAR_WIDTH // 2 / self.zoom_level
-            for i, root in enumerate(self.roots):
-                layout(root, vx_base, 80 / self.zoom_level + i * 200)
+            zoom = self.zoom_level
+            _, nodes, parents, lx, ly, starts = self._tree_layout(zoom)
+
+            # pan and zoom for all nodes at once
+            xs = self.grid_width + (lx + self.tree_offset_x) * zoom
+            ys = (ly + self.tree_offset_y) * zoom
+            current = self.current_node
+
+        screen = self.screen
+        draw_line = pygame.draw.line
+        draw_rect = pygame.draw.rect
+        edge_w = max(1, int(2 * zoom))
+        border_w = max(1, int(1 * zoom))
+        radius = max(1, int(5 * zoom))
+        labels = zoom > 0.4
+
+        # cull edges by bounding box
+        has_parent = parents >= 0
+        px, py = xs[parents], ys[parents]
+        edges = np.flatnonzero(
+            has_parent
+            & (np.maximum(xs, px) >= tree_rect.left - edge_w) & (np.minimum(xs, px) <= tree_rect.right + edge_w)
+            & (np.maximum(ys, py) >= tree_rect.top - edge_w) & (np.minimum(ys, py) <= tree_rect.bottom + edge_w)
+        )
+        # cull nodes with some slack, the exact test runs on their rects;
+        # the depth label hangs off the right of a node, so nodes just
+        # left of the sidebar still count
+        node_left = tree_rect.left - (DEPTH_LABEL_MARGIN if labels else 0)
+        near = np.flatnonzero(
+            (xs + node_w >= node_left) & (xs - node_w <= tree_rect.right)
+            & (ys + node_h >= tree_rect.top) & (ys - node_h <= tree_rect.bottom)
+        )
 
-            # Draw edges and nodes
-            def draw_edges(node):
-                for child in node.children:
-                    pygame.draw.line(self.screen, (150, 150, 150), (node.x, node.y), (child.x, child.y), max(1, int(2 * self.zoom_level)))
-                    draw_edges(child)
-            
-            def draw_nodes(node):
-                for child in node.children:
-                    draw_nodes(child)
-                
-                color = (100, 255, 100) if node == self.current_node else (220, 220, 220)
-                pygame.draw.rect(self.screen, color, node.rect, border_radius=max(1, int(5 * self.zoom_level)))
-                pygame.draw.rect(self.screen, (50, 50, 50), node.rect, max(1, int(1 * self.zoom_level)), border_radius=max(1, int(5 * self.zoom_level)))
-                
-                if self.zoom_level > 0.4:
-                    label = self.font.render(f"{int(node.grid.sum())}", True, (0, 0, 0))
-                    self.screen.blit(label, (node.rect.x + (node.rect.w - label.get_width())//2, node.rect.y + (node.rect.h - label.get_height())//2))
-                    
-                    depth_label = self.depth_font.render(f"d:{node.depth}", True, (100, 100, 100))
-                    self.screen.blit(depth_label, (node.rect.right + 2, node.rect.y))
+        lod = zoom < LOD_ZOOM
+        if lod:
+            # node rects as Rect.center would place them (it rounds half away from zero)
+            lefts = np.trunc(xs + np.copysign(0.5, xs)).astype(np.intp) - node_w // 2
+            tops = np.trunc(ys + np.copysign(0.5, ys)).astype(np.intp) - node_h // 2
+            shown = ((lefts + node_w >= node_left) & (lefts <= tree_rect.right)
+                     & (tops + node_h >= tree_rect.top) & (tops <= tree_rect.bottom))
+
+        xl, yl, pl = xs.tolist(), ys.tolist(), parents.tolist()
+        # Draw edges and nodes, root by root
+        visible, boxes = [], []
+        for r in range(len(starts) - 1):
+            lo, hi = starts[r], starts[r + 1]
+            for i in edges[(edges >= lo) & (edges < hi)].tolist():
+                p = pl[i]
+                draw_line(screen, (150, 150, 150), (xl[p], yl[p]), (xl[i], yl[i]), edge_w)
+
+            # children are drawn before their parent
+            order = near[(near >= lo) & (near < hi)][::-1]
+            if lod:
+                order = order[shown[order]]
+                drawn = [nodes[i] for i in order.tolist()]
+                self._fill_node_boxes(lefts[order], tops[order], node_w, node_h, border_w,
+                                      [node is current for node in drawn], tree_rect)
+                visible.extend(drawn)
+                boxes.extend(zip(lefts[order].tolist(), tops[order].tolist(),
+                                 (lefts[order] + node_w).tolist(), (tops[order] + node_h).tolist()))
+                continue
 
-            for root in self.roots:
-                draw_edges(root)
-                draw_nodes(root)
-        
+            for i in order.tolist():
+                node = nodes[i]
+                node.x, node.y = xl[i], yl[i]
+                rect = node.rect
+                rect.w = node_w
+                rect.h = node_h
+                rect.center = (node.x, node.y)
+                if (rect.right < node_left or rect.left > tree_rect.right
+                        or rect.bottom < tree_rect.top or rect.top > tree_rect.bottom):
+                    continue
+                visible.append(node)
+                boxes.append((rect.x, rect.y, rect.right, rect.bottom))
+                color = (100, 255, 100) if node is current else (220, 220, 220)
+                draw_rect(screen, color, rect, border_radius=radius)
+                draw_rect(screen, (50, 50, 50), rect, border_w, border_radius=radius)
+
+                if labels:
+                    label = self._render(self.font, f"{node.cell_count}", (0, 0, 0))
+                    screen.blit(label, (rect.x + (rect.w - label.get_width())//2, rect.y + (rect.h - label.get_height())//2))
+
+                    depth_label = self._render(self.depth_font, f"d:{node.depth}", (100, 100, 100))
+                    screen.blit(depth_label, (rect.right + 2, rect.y))
+
+        # only what was drawn can be clicked
+        self._visible_nodes = visible
+        self._visible_boxes = np.array(boxes, dtype=np.int32).reshape(-1, 4)
+    
         self.screen.set_clip(old_clip)
         pygame.draw.line(self.screen, (150, 150, 150), (self.grid_width, 0), (self.grid_width, self.screen_h), 2)
 
-    def draw_ui(self):
-        pygame.draw.rect(self.screen, (220, 220, 220), (0, 0, self.screen_w, TOP))
-        
-        with self.lock:
-            searching = self.searching
+    def _fill_node_boxes(self, lefts, tops, w, h, border_w, is_current, clip):
+        """Fill w x h node boxes with a border in one write to the screen's pixels."""
+        ring = np.ones((w, h), dtype=bool)
+        ring[border_w:w - border_w, border_w:h - border_w] = False
+        fill = np.where(is_current, self.screen.map_rgb((100, 255, 100)),
+                        self.screen.map_rgb((220, 220, 220)))
+        colors = np.where(ring, self.screen.map_rgb((50, 50, 50)), fill[:, None, None])
+        px = lefts[:, None, None] + np.arange(w)[:, None]
+        py = tops[:, None, None] + np.arange(h)
+        px, py = np.broadcast_arrays(px, py)
+        inside = (px >= clip.left) & (px < clip.right) & (py >= clip.top) & (py < clip.bottom)
+        pix = pygame.surfarray.pixels2d(self.screen)
+        pix[px[inside], py[inside]] = colors[inside]
+        del pix
+
+    def _render_header(self, searching):
+        """The button bar as a surface; it only depends on ``searching``."""
+        header = pygame.Surface((self.screen_w, TOP)).convert()
+        header.fill((220, 220, 220))
 
         if searching:
             go_deeper_text = "Searching..."
@@ -234,24 +521,43 @@ class TreeVisualizer:
             (self.go_deeper_btn, go_deeper_text, go_deeper_color),
             (self.rerender_btn, "Rerender", (200, 200, 255))
         ]:
-            pygame.draw.rect(self.screen, color, btn, border_radius=5)
-            pygame.draw.rect(self.screen, (0, 0, 0), btn, 1, border_radius=5)
+            pygame.draw.rect(header, color, btn, border_radius=5)
+            pygame.draw.rect(header, (0, 0, 0), btn, 1, border_radius=5)
             txt_surf = self.btn_font.render(text, True, (0, 0, 0))
-            self.screen.blit(txt_surf, (btn.x + (btn.w - txt_surf.get_width())//2, btn.y + (btn.h - txt_surf.get_height())//2))
+            header.blit(txt_surf, (btn.x + (btn.w - txt_surf.get_width())//2, btn.y + (btn.h - txt_surf.get_height())//2))
+        return header
 
-    def _scan_configs(self, extension=".npz"):
+    def draw_ui(self):
+        with self.lock:
+            searching = self.searching
+        self.screen.blit(self._headers[searching], (0, 0))
+
+    def _scan_configs(self, extension=".npz", exclude=()):
         path = os.path.join(os.path.dirname(__file__), "..", "data")
-        if not os.path.isdir(path):
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:
             return []
-        return sorted(
-            f for f in os.listdir(path)
-            if f.endswith(extension)
-        )
+        # adding or removing files bumps the directory mtime
+        key = (extension, exclude)
+        cached = self._configs_cache.get(key)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+        with os.scandir(path) as entries:
+            files = sorted(
+                e.name for e in entries
+                if e.name.endswith(extension) and not e.name.endswith(exclude)
+            )
+        self._configs_cache[key] = (mtime, files)
+        return files
 
     def open_load_menu(self, mode="grid"):
         self.load_mode = mode # "grid" or "tree"
-        ext = ".npz" if mode == "grid" else ".tree.pkl"
-        self.config_files = self._scan_configs(ext)
+        if mode == "grid":
+            self.config_files = self._scan_configs(".npz", exclude=".tree.npz")
+        else:
+            # trees saved before the npz format are pickles
+            self.config_files = self._scan_configs((".tree.npz", ".tree.pkl"))
         if not self.config_files:
             print(colored("WARNING:", "yellow", attrs=["bold"]) + f" No saved {mode} configs found.")
             return
@@ -260,11 +566,12 @@ class TreeVisualizer:
             self.searching = False
 
     def draw_load_menu(self):
-        overlay = pygame.Surface(self.screen.get_size(), pygame.SRCALPHA)
-        overlay.fill((240, 240, 240, 240))
-        self.screen.blit(overlay, (0, 0))
+        if self._menu_overlay is None:
+            self._menu_overlay = pygame.Surface(self.screen.get_size(), pygame.SRCALPHA)
+            self._menu_overlay.fill((240, 240, 240, 240))
+        self.screen.blit(self._menu_overlay, (0, 0))
 
-        title = self.btn_font.render("Select configuration to load", True, (0, 0, 0))
+        title = self._render(self.btn_font, "Select configuration to load", (0, 0, 0))
         self.screen.blit(title, (20, 15))
 
         for i, name in enumerate(self.config_files):
@@ -276,7 +583,7 @@ class TreeVisualizer:
             else:
                 pygame.draw.rect(self.screen, (220, 220, 220), rect)
 
-            label = self.font.render(name, True, (0, 0, 0))
+            label = self._render(self.font, name, (0, 0, 0))
             self.screen.blit(label, (rect.x + 5, rect.y + 3))
 
     def search_worker(self):
@@ -290,19 +597,22 @@ class TreeVisualizer:
                 if len(node.children) > 4 and node.parent:
                     print("  " + colored("Too", "red") + " many branches, backtracking...")
                     self.current_node = node.parent
-                    self.game.grid = self.current_node.grid.copy()
+                    self._set_grid(self.current_node.grid)
                     continue
                 
-                grid_copy = node.grid.copy()
-                excluded_copy = [g.copy() for g in node.excluded_from_sat]
+                target = node.grid
+                # stored grids are read-only, a snapshot of the list is enough
+                excluded = tuple(node.excluded_from_sat)
                 current_depth = node.depth
 
+            start = time.perf_counter()
             ancestor = solve_initial_minimal_iterative(
-                grid_copy,
+                target,
                 steps=1,
                 timeout_ms=10000 * max(1, current_depth),
-                exclude_grids=excluded_copy
+                exclude_grids=excluded
             )
+            self._solve_time = 0.8 * self._solve_time + 0.2 * (time.perf_counter() - start)
             
             with self.lock:
                 if not self.searching:
@@ -311,9 +621,10 @@ class TreeVisualizer:
                 if ancestor is not None:
                     print("  " + colored("Found", "green") + " ancestor")
                     new_node = self.current_node.add_child(ancestor)
+                    ancestor.flags.writeable = False
                     self.current_node.excluded_from_sat.append(ancestor)
                     self.current_node = new_node
-                    self.game.grid = new_node.grid.copy()
+                    self._set_grid(new_node.grid)
                 else:
                     print("  " + colored("No", "red") + " more ancestors, backtracking...")
                     if random.random() < 0.08 * len(self.current_node.parent.children):
@@ -322,54 +633,47 @@ class TreeVisualizer:
                         for _ in range(steps):
                             if self.current_node.parent:
                                 self.current_node = self.current_node.parent
-                                self.game.grid = self.current_node.grid.copy()
+                                self._set_grid(self.current_node.grid)
                             else:
                                 break
                     elif random.random() < 0.05 * len(self.current_node.parent.children):
                         print("  " + colored("Random Jump", "yellow") + " to a random node")
-                        all_nodes = []
-                        stack = list(self.roots)
-                        while stack:
-                            n = stack.pop()
-                            all_nodes.append(n)
-                            stack.extend(n.children)
+                        all_nodes = list(level_order(self.roots))
                         if all_nodes:
                             self.current_node = random.choice(all_nodes)
-                            self.game.grid = self.current_node.grid.copy()
+                            self._set_grid(self.current_node.grid)
                         else:
                             # Fallback
                             if self.current_node.parent:
                                 self.current_node = self.current_node.parent
-                                self.game.grid = self.current_node.grid.copy()
+                                self._set_grid(self.current_node.grid)
                     else:
                         print("  " + colored("Backtracking", "red") + " 1 step")
                         if self.current_node.parent:
                             self.current_node = self.current_node.parent
-                            self.game.grid = self.current_node.grid.copy()
+                            self._set_grid(self.current_node.grid)
                         else:
                             print("  " + colored("Random Jump", "yellow") + " to a random node")
-                            all_nodes = []
-                            stack = list(self.roots)
-                            while stack:
-                                n = stack.pop()
-                                all_nodes.append(n)
-                                stack.extend(n.children)
+                            all_nodes = list(level_order(self.roots))
                             if all_nodes:
                                 self.current_node = random.choice(all_nodes)
-                                self.game.grid = self.current_node.grid.copy()
+                                self._set_grid(self.current_node.grid)
                             else:
                                 # Fallback
                                 if self.current_node.parent:
                                     self.current_node = self.current_node.parent
-                                    self.game.grid = self.current_node.grid.copy()
+                                    self._set_grid(self.current_node.grid)
             
-            # Short sleep to prevent tight loop if SAT finishes instantly
-            time.sleep(0.1)
+            # Yield to the UI for a fraction of the recent solve time
+            self._search_wakeup.wait(min(0.1, 0.1 * self._solve_time))
 
     def toggle_search(self):
         with self.lock:
             self.searching = not self.searching
-            if self.searching:
+            if not self.searching:
+                self._search_wakeup.set()
+            else:
+                self._search_wakeup.clear()
                 if self.search_thread is None or not self.search_thread.is_alive():
                     self.search_thread = threading.Thread(target=self.search_worker, daemon=True)
                     self.search_thread.start()
@@ -379,26 +683,31 @@ class TreeVisualizer:
             if self.current_node.parent:
                 # If we are at an ancestor and step forward, move towards the future (root)
                 self.current_node = self.current_node.parent
-                self.game.grid = self.current_node.grid.copy()
+                self._set_grid(self.current_node.grid)
             else:
                 # If we are at the latest state (no parent), calculate new state
                 self.game.step()
+                self._grid_dirty = True
+                self._tree_dirty = True
                 new_node = Node(self.game.grid)
                 new_node.add_child_node(self.current_node)
                 self.current_node.parent = new_node
                 
                 # If the current node was a root, update the root list
-                if self.current_node in self.roots:
-                    idx = self.roots.index(self.current_node)
+                idx = self._root_index.pop(id(self.current_node), None)
+                if idx is not None:
                     self.roots[idx] = new_node
+                    self._root_index[id(new_node)] = idx
                 
                 self.current_node = new_node
 
     def handle_events(self):
-        keys = pygame.key.get_pressed()
         for e in pygame.event.get():
             if e.type == pygame.QUIT:
                 return False
+            # hovering only changes the picture in the load menu
+            if e.type != pygame.MOUSEMOTION or self.loading:
+                self._invalidate()
             
             # --- LOADING MODE ---
             if self.loading:
@@ -410,20 +719,30 @@ class TreeVisualizer:
                     if 0 <= idx < len(self.config_files):
                         path = os.path.join(os.path.dirname(__file__), "..", "data", self.config_files[idx])
                         if self.load_mode == "grid":
-                            data = np.load(path)
+                            with np.load(path) as data:
+                                grid = data["grid"]
                             with self.lock:
-                                self.game.grid = data["grid"].copy()
+                                # saved grids may be int64; the board is uint8
+                                self._set_grid(grid.astype(np.uint8, copy=False))
                                 new_root = Node(self.game.grid)
-                                self.roots.append(new_root) # Add as new disconnected root
+                                self._add_root(new_root) # Add as new disconnected root
                                 self.current_node = new_root
                                 self.searching = False
                         else:
-                            with open(path, "rb") as f:
-                                data = pickle.load(f)
+                            if path.endswith(".tree.pkl"):
+                                with open(path, "rb") as f:
+                                    data = pickle.load(f)
+                                roots, current = data["roots"], data["current_node"]
+                                # depths are not saved by older trees
+                                for root in roots:
+                                    root.set_depth(0)
+                            else:
+                                with np.load(path) as data:
+                                    roots, current = tree_from_arrays(data)
                             with self.lock:
-                                self.roots = data["roots"]
-                                self.current_node = data["current_node"]
-                                self.game.grid = self.current_node.grid.copy()
+                                self._set_roots(roots)
+                                self.current_node = current
+                                self._set_grid(self.current_node.grid)
                                 self.searching = False
                         self.loading = False
                         self.paused = True
@@ -445,8 +764,9 @@ class TreeVisualizer:
                 elif self.clear_btn.collidepoint(mx, my):
                     with self.lock:
                         self.game.grid[:] = 0
+                        self._grid_dirty = True
                         new_root = Node(self.game.grid)
-                        self.roots = [new_root]
+                        self._set_roots([new_root])
                         self.current_node = new_root
                         self.searching = False
                 elif self.step_btn.collidepoint(mx, my):
@@ -464,41 +784,32 @@ class TreeVisualizer:
                         is_searching = self.searching
                     
                     if not is_searching:
-                        def check_nodes(node):
-                            if node.rect.collidepoint(mx, my):
-                                with self.lock:
-                                    self.current_node = node
-                                    self.game.grid = node.grid.copy()
-                                    self.searching = False 
-                                return True
-                            for child in node.children:
-                                if check_nodes(child): return True
-                            return False
-                        
-                        found = False
-                        for root in self.roots:
-                            if check_nodes(root):
-                                found = True
-                                break
-                        
-                        if not found:
+                        node = self._node_at(mx, my)
+                        if node is not None:
+                            with self.lock:
+                                self.current_node = node
+                                self._set_grid(node.grid)
+                                self.searching = False 
+                        else:
                             # Grid interaction
                             gx, gy = mx // CELL, (my - TOP) // CELL
                             if 0 <= gx < self.w and 0 <= gy < self.h:
                                 with self.lock:
                                     self.game.grid[gy, gx] ^= 1
+                                    self._grid_dirty = True
                                     new_root = Node(self.game.grid)
-                                    self.roots.append(new_root)
+                                    self._add_root(new_root)
                                     self.current_node = new_root
                                     self.searching = False
 
             if e.type == pygame.MOUSEWHEEL:
-                if keys[pygame.K_LCTRL] or keys[pygame.K_RCTRL]:
+                mods = pygame.key.get_mods()
+                if mods & pygame.KMOD_CTRL:
                     
                     old_zoom = self.zoom_level
                     self.zoom_level *= (1.1 ** e.y)
                     self.zoom_level = max(0.1, min(self.zoom_level, 5.0))
-                elif keys[pygame.K_LSHIFT] or keys[pygame.K_RSHIFT]:
+                elif mods & pygame.KMOD_SHIFT:
                     self.tree_offset_x += e.y * 30 / self.zoom_level
                 else:
                     self.tree_offset_y += e.y * 30 / self.zoom_level
@@ -515,8 +826,9 @@ class TreeVisualizer:
                 elif e.key == pygame.K_c:
                     with self.lock:
                         self.game.grid[:] = 0
+                        self._grid_dirty = True
                         new_root = Node(self.game.grid)
-                        self.roots = [new_root]
+                        self._set_roots([new_root])
                         self.current_node = new_root
                         self.searching = False
                 elif e.key == pygame.K_RIGHT:
@@ -535,25 +847,29 @@ class TreeVisualizer:
         name = datetime.datetime.now().strftime("grid_%Y%m%d_%H%M%S.npz")
         with self.lock:
             grid_to_save = self.game.grid.copy()
-        np.savez_compressed(os.path.join(path, name), grid=grid_to_save)
-        print(colored("Saved Grid", "green", attrs=["bold"]) + f" {name}")
+        future = self._io_pool.submit(np.savez_compressed, os.path.join(path, name), grid=grid_to_save)
+        future.add_done_callback(lambda f: self._report_save(f, "Saved Grid", name))
 
     def save_tree(self):
         path = os.path.join(os.path.dirname(__file__), "..", "data")
         os.makedirs(path, exist_ok=True)
-        name = datetime.datetime.now().strftime("tree_%Y%m%d_%H%M%S.tree.pkl")
+        name = datetime.datetime.now().strftime("tree_%Y%m%d_%H%M%S.tree.npz")
         with self.lock:
-            # We save roots and current_node reference. 
-            # Note: pickle might hit recursion depth for very large trees.
-            data = {
-                "roots": self.roots,
-                "current_node": self.current_node,
-                "w": self.w,
-                "h": self.h
-            }
-        with open(os.path.join(path, name), "wb") as f:
-            pickle.dump(data, f)
-        print(colored("Saved Tree", "green", attrs=["bold"]) + f" {name}")
+            # flatten under the lock so the worker cannot change the tree
+            # halfway; compression and the write happen in the background
+            arrays = tree_to_arrays(self.roots, self.current_node)
+        future = self._io_pool.submit(
+            np.savez_compressed, os.path.join(path, name), w=self.w, h=self.h, **arrays
+        )
+        future.add_done_callback(lambda f: self._report_save(f, "Saved Tree", name))
+
+    @staticmethod
+    def _report_save(future, what, name):
+        err = future.exception()
+        if err is not None:
+            print(colored("ERROR:", "red", attrs=["bold"]) + f" saving {name} failed: {err}")
+        else:
+            print(colored(what, "green", attrs=["bold"]) + f" {name}")
 
     def run(self):
         while True:
@@ -568,15 +884,35 @@ class TreeVisualizer:
             if not is_searching and not is_paused and not is_loading:
                 self.step_forward()
             
-            self.screen.fill((255, 255, 255))
-            self.draw_grid()
-            self.draw_tree()
-            self.draw_ui()
-
-            if self.loading:
-                self.draw_load_menu()
-            
-            pygame.display.flip()
+            # board, sidebar and button bar cover the whole window, so only the
+            # regions marked dirty (by events, stepping or the worker) are
+            # repainted; the menu overlays everything and is drawn in full
+            with self.lock:
+                paint_grid = self._grid_dirty
+                paint_tree = self._tree_dirty
+                paint_ui = self._ui_dirty or paint_tree
+                self._tree_dirty = self._ui_dirty = False
+            if is_loading and (paint_grid or paint_ui):
+                paint_grid = paint_tree = True
+
+            if paint_grid or paint_ui:
+                # the screen keeps every region between frames, so only the
+                # repainted rects are pushed to the display
+                dirty_rects = []
+                if paint_grid:
+                    self.draw_grid()
+                    dirty_rects.append(self._board_rect)
+                if paint_tree:
+                    self.draw_tree()
+                    dirty_rects.append(self._sidebar_rect)
+                # the button bar overlaps the top of the sidebar
+                self.draw_ui()
+                dirty_rects.append(self._header_rect)
+
+                if is_loading:
+                    self.draw_load_menu()
+                
+                pygame.display.update(dirty_rects)
             self.clock.tick(FPS)
         pygame.quit()
 
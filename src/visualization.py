@@ -2,9 +2,10 @@ import pygame
 import numpy as np
 import os
 import datetime
-from matplotlib import cm
+import threading
+import matplotlib
 
-from game_of_life import GameOfLife
+from game_of_life import GameOfLife, NeighborCounter
 from sat_solver import solve_initial_for_target, solve_initial_minimal_iterative
 from termcolor import colored
 CELL = 12
@@ -13,7 +14,9 @@ TOP = 50
 GRID_COLOR = (0, 0, 0)
 DEAD = (255, 255, 255)
 
-viridis = cm.get_cmap("viridis", 9)
+# viridis colour of each neighbour count 0..8
+viridis = matplotlib.colormaps["viridis"].resampled(9)
+BOARD_COLORS = (viridis(np.arange(9))[:, :3] * 255).astype(np.uint8).tolist()
 
 
 class Visualizer:
@@ -30,16 +33,51 @@ class Visualizer:
         self.load_btn = pygame.Rect(100, 10, 90, 30)
         self.loading = False
         self.config_files = []
+        # set whenever the picture may have changed
+        self._dirty = True
+        # load menu entry under the mouse at the last motion event
+        self._menu_hover = None
+
+        # backward solves run in the background so the window keeps
+        # responding; the result is picked up by run()
+        self._solve_thread = None
+        self._solve_result = None
+        # the board the running solve was asked about
+        self._solve_target = None
+        self._solve_stop = threading.Event()
+
+        # uint8 counts, usable as palette indices
+        self._count_neighbors = NeighborCounter()
+
+        # cells are written straight into this surface's pixels, between
+        # grid lines drawn once here
+        self._board = pygame.Surface((w * CELL, h * CELL)).convert()
+        # palette indexed by (alive, neighbour count)
+        self._board_lut = np.array([
+            [self._board.map_rgb(DEAD)] * 9,
+            [self._board.map_rgb(c) for c in BOARD_COLORS],
+        ], dtype=np.uint32)
+        pix = pygame.surfarray.pixels2d(self._board)
+        pix[::CELL, :] = self._board.map_rgb(GRID_COLOR)
+        pix[:, ::CELL] = self._board.map_rgb(GRID_COLOR)
+        del pix
+
+        # the buttons never change, render them once
+        self._chrome = pygame.Surface((self.screen.get_width(), TOP), pygame.SRCALPHA).convert_alpha()
+        pygame.draw.rect(self._chrome, (200, 255, 200), self.save_btn)
+        pygame.draw.rect(self._chrome, (200, 220, 255), self.load_btn)
+        self._chrome.blit(self.font.render("Save", True, (0, 0, 0)), (28, 18))
+        self._chrome.blit(self.font.render("Load", True, (0, 0, 0)), (118, 18))
+
+        # load menu backdrop and the labels it has shown, by text
+        self._menu_overlay = pygame.Surface(self.screen.get_size(), pygame.SRCALPHA).convert_alpha()
+        self._menu_overlay.fill((240, 240, 240, 240))
+        self._labels = {}
 
     # ---------- helpers ----------
 
     def neighbors(self):
-        return sum(
-            np.roll(np.roll(self.game.grid, i, 0), j, 1)
-            for i in (-1, 0, 1)
-            for j in (-1, 0, 1)
-            if (i, j) != (0, 0)
-        )
+        return self._count_neighbors(self.game.grid)
 
     # ---------- IO ----------
 
@@ -57,7 +95,8 @@ class Visualizer:
             return []
         return sorted(
             f for f in os.listdir(path)
-            if f.endswith(".npz")
+            # saved trees share the folder but hold no "grid" array
+            if f.endswith(".npz") and not f.endswith(".tree.npz")
         )
 
     
@@ -67,6 +106,8 @@ class Visualizer:
             print(colored("WARNING:", "yellow", attrs=["bold"]) + " No saved configs found.")
             return
         self.loading = True
+        # forget the entry hovered in an earlier visit to the menu
+        self._menu_hover = None
     # ---------- drawing ----------
 
     def draw(self):
@@ -74,49 +115,44 @@ class Visualizer:
             # solid background when menu is open
             self.screen.fill((240, 240, 240))
         else:
-            self.screen.fill(DEAD)
+            # the board covers everything below the button strip
+            self.screen.fill(DEAD, (0, 0, self.screen.get_width(), TOP))
             neigh = self.neighbors()
 
-            for y in range(self.game.height):
-                for x in range(self.game.width):
-                    if self.game.grid[y, x]:
-                        rgba = viridis(neigh[y, x] / 8.0)
-                        color = tuple(int(255 * c) for c in rgba[:3])
-                    else:
-                        color = DEAD
-
-                    pygame.draw.rect(
-                        self.screen,
-                        color,
-                        (x * CELL, y * CELL + TOP, CELL, CELL),
-                    )
-
-            # grid lines
-            for x in range(self.game.width + 1):
-                pygame.draw.line(
-                    self.screen, GRID_COLOR,
-                    (x * CELL, TOP),
-                    (x * CELL, TOP + self.game.height * CELL), 1
-                )
-            for y in range(self.game.height + 1):
-                pygame.draw.line(
-                    self.screen, GRID_COLOR,
-                    (0, y * CELL + TOP),
-                    (self.game.width * CELL, y * CELL + TOP), 1
-                )
-
-        pygame.draw.rect(self.screen, (200, 255, 200), self.save_btn)
-        pygame.draw.rect(self.screen, (200, 220, 255), self.load_btn)
-        self.screen.blit(self.font.render("Save", True, (0, 0, 0)), (28, 18))
-        self.screen.blit(self.font.render("Load", True, (0, 0, 0)), (118, 18))
+            # one palette lookup per cell, broadcast into the CELL x CELL
+            # blocks of the surface's (x, y) pixels right of and below the
+            # grid lines; a loaded grid may be larger
+            h, w = self.game.height, self.game.width
+            live = (self.game.grid[:h, :w] != 0).view(np.uint8)
+            colors = self._board_lut[live, neigh[:h, :w]]
+            pix = pygame.surfarray.pixels2d(self._board)
+            pix.reshape(w, CELL, h, CELL)[:, 1:, :, 1:] = colors.T[:, None, :, None]
+            # the surface stays locked while the view is alive
+            del pix
+            self.screen.blit(self._board, (0, TOP))
+
+        self.screen.blit(self._chrome, (0, 0))
 
         
+    def _label(self, text):
+        """Black label for ``text``, rendered the first time it is asked for."""
+        surf = self._labels.get(text)
+        if surf is None:
+            surf = self._labels[text] = self.font.render(text, True, (0, 0, 0))
+        return surf
+
+    def _menu_row_at(self, pos):
+        """Index of the load menu entry under ``pos``, or None."""
+        x, y = pos
+        i, dy = divmod(y - 50, 24)
+        if 20 <= x < 380 and 0 <= i < len(self.config_files) and dy < 22:
+            return i
+        return None
+
     def draw_load_menu(self):
-        overlay = pygame.Surface(self.screen.get_size(), pygame.SRCALPHA)
-        overlay.fill((240, 240, 240, 240))
-        self.screen.blit(overlay, (0, 0))
+        self.screen.blit(self._menu_overlay, (0, 0))
 
-        title = self.font.render("Select configuration to load", True, (0, 0, 0))
+        title = self._label("Select configuration to load")
         self.screen.blit(title, (20, 15))
 
         for i, name in enumerate(self.config_files):
@@ -128,7 +164,7 @@ class Visualizer:
             else:
                 pygame.draw.rect(self.screen, (220, 220, 220), rect)
 
-            label = self.font.render(name, True, (0, 0, 0))
+            label = self._label(name)
             self.screen.blit(label, (rect.x + 5, rect.y + 3))
     # ---------- events ----------
 
@@ -136,6 +172,15 @@ class Visualizer:
         for e in pygame.event.get():
             if e.type == pygame.QUIT:
                 return False
+            # hovering only changes the picture in the load menu, and only
+            # when the mouse moves onto another entry
+            if e.type != pygame.MOUSEMOTION:
+                self._dirty = True
+            elif self.loading:
+                hover = self._menu_row_at(e.pos)
+                if hover != self._menu_hover:
+                    self._menu_hover = hover
+                    self._dirty = True
 
             # ---------------- LOADING MODE ----------------
             if self.loading:
@@ -153,8 +198,11 @@ class Visualizer:
                             "data",
                             self.config_files[idx],
                         )
-                        data = np.load(path)
-                        self.game.grid = data["grid"].copy()
+                        with np.load(path) as data:
+                            grid = data["grid"]
+                        # the array read from the archive is already our own;
+                        # saved grids may be int64, the board is uint8
+                        self.game.grid = grid.astype(np.uint8, copy=False)
                         self.paused = True
                         self.loading = False
                         print(colored("Loaded", "green") + f" {self.config_files[idx]}")
@@ -166,20 +214,22 @@ class Visualizer:
                     self.paused = not self.paused
 
                 elif e.key == pygame.K_b:
-                    print(colored("Backward", "blue") + " solve requested")
-                    sol = solve_initial_minimal_iterative(
-                        self.game.grid,
-                        steps=1,
-                        start_bound=500,
-                        timeout_ms=60000
-                    )
-
-                    if sol is not None:
-                        print(colored("Solution", "green", attrs=["bold"]) + " applied to grid")
-                        self.game.grid = sol
-                        self.paused = True
+                    if self._solve_thread is not None:
+                        print(colored("Backward", "blue") + " solve already running")
                     else:
-                        print(colored("No", "red", attrs=["bold"]) + " solution found")
+                        print(colored("Backward", "blue") + " solve requested")
+                        self._solve_stop.clear()
+                        self._solve_result = None
+                        self._solve_target = self.game.grid.copy()
+                        self._solve_thread = threading.Thread(
+                            target=self._backward_solve, args=(self._solve_target,), daemon=True
+                        )
+                        self._solve_thread.start()
+                        self.paused = True
+
+                elif e.key == pygame.K_ESCAPE and self._solve_thread is not None:
+                    print(colored("Cancelling", "yellow") + " backward solve after the current bound")
+                    self._solve_stop.set()
                         
                 elif e.key == pygame.K_c:
                     self.game.grid[:] = 0
@@ -206,22 +256,60 @@ class Visualizer:
 
         return True
 
+    # ---------- backward solve ----------
+
+    def _backward_solve(self, target):
+        """Background thread for the B key."""
+        self._solve_result = solve_initial_minimal_iterative(
+            target,
+            steps=1,
+            start_bound=500,
+            timeout_ms=60000,
+            stop=self._solve_stop
+        )
+
+    def _finish_backward_solve(self):
+        """Apply a finished backward solve unless it was cancelled or the board changed."""
+        if self._solve_thread is None or self._solve_thread.is_alive():
+            return
+        self._solve_thread = None
+        sol = self._solve_result
+        if self._solve_stop.is_set():
+            return
+
+        # the board stays interactive while solving; a predecessor of the
+        # old board must not replace whatever is shown now
+        if not np.array_equal(self.game.grid, self._solve_target):
+            print(colored("Discarded", "yellow") + " backward solve, the board changed meanwhile")
+        elif sol is not None:
+            print(colored("Solution", "green", attrs=["bold"]) + " applied to grid")
+            self.game.grid = sol
+            self.paused = True
+        else:
+            print(colored("No", "red", attrs=["bold"]) + " solution found")
+        self._dirty = True
+
     # ---------- loop ----------
 
     def run(self):
         running = True
         while running:
             running = self.handle()
+            self._finish_backward_solve()
 
             if not self.paused and not self.loading:
                 self.game.step()
+                self._dirty = True
 
-            self.draw()
+            # a paused, untouched board keeps its last frame
+            if self._dirty:
+                self.draw()
 
-            if self.loading:
-                self.draw_load_menu()
+                if self.loading:
+                    self.draw_load_menu()
 
-            pygame.display.flip()
+                pygame.display.flip()
+                self._dirty = False
             self.clock.tick(FPS)
 
         pygame.quit()